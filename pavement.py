@@ -7,6 +7,8 @@ Author: Civil Engineering Student
 
 import streamlit as st
 import math
+from string import Template
+from types import MappingProxyType
 
 # ================================
 # ฟังก์ชันคำนวณหลัก
@@ -17,52 +19,35 @@ def log10(x):
     return math.log10(x)
 
 
-def calculate_sn_from_aashto(W18, ZR, So, delta_psi, MR):
+LN10 = math.log(10.0)
+
+
+def _solve_sn(W18, ZR, So, delta_psi, MR):
     """
-    คำนวณ Structural Number (SN) จากสมการ AASHTO 1993
-    ใช้ Newton-Raphson method
+    แก้สมการ AASHTO 1993 หา SN ด้วย Newton-Raphson
+    รวมสมการและอนุพันธ์ไว้ใน loop เดียว (ไม่มี function call ต่อรอบ)
     """
+    # ค่าที่ไม่ขึ้นกับ SN คำนวณครั้งเดียวนอก loop
+    # (-0.20 - 8.07 = -8.27 รวมเป็นค่าคงที่เดียว)
+    log_psi_ratio = log10(delta_psi / 2.7)
+    c_const = ZR * So - 8.27 + 2.32 * log10(MR) - log10(W18)
     
-    def aashto_equation(SN):
-        """AASHTO 1993 Design Equation"""
-        if SN <= 0:
-            SN = 0.01
-            
-        term1 = ZR * So
-        term2 = 9.36 * log10(SN + 1)
-        term3 = -0.20
-        
-        numerator = log10(delta_psi / (4.2 - 1.5))
-        denominator = 0.40 + (1094 / ((SN + 1) ** 5.19))
-        term4 = numerator / denominator
-        
-        term5 = 2.32 * log10(MR)
-        term6 = -8.07
-        
-        return term1 + term2 + term3 + term4 + term5 + term6 - log10(W18)
-    
-    def aashto_derivative(SN):
-        """อนุพันธ์ของสมการ AASHTO"""
-        if SN <= 0:
-            SN = 0.01
-            
-        term1 = 9.36 / ((SN + 1) * math.log(10))
-        
-        numerator = log10(delta_psi / (4.2 - 1.5))
-        denominator = 0.40 + (1094 / ((SN + 1) ** 5.19))
-        d_denominator = -(1094 * 5.19 * ((SN + 1) ** -6.19))
-        term2 = -numerator * d_denominator / (denominator ** 2)
-        
-        return term1 + term2
-    
-    # Newton-Raphson method
     SN = 3.0
     tolerance = 1e-6
     max_iterations = 100
     
     for i in range(max_iterations):
-        f_SN = aashto_equation(SN)
-        f_prime_SN = aashto_derivative(SN)
+        x = SN + 1
+        p = x ** 5.19  # ใช้ร่วมกันทั้งสมการและอนุพันธ์ ((x ** -6.19) = 1 / (p * x))
+        
+        # AASHTO 1993 Design Equation
+        denominator = 0.40 + 1094.0 / p
+        f_SN = c_const + 9.36 * log10(x) + log_psi_ratio / denominator
+        
+        # อนุพันธ์เทียบกับ SN
+        d_denominator = -1094.0 * 5.19 / (p * x)
+        f_prime_SN = (9.36 / (x * LN10)
+                      - log_psi_ratio * d_denominator / (denominator * denominator))
         
         if abs(f_prime_SN) < 1e-10:
             break
@@ -77,6 +62,15 @@ def calculate_sn_from_aashto(W18, ZR, So, delta_psi, MR):
     return max(SN, 0)
 
 
+@st.cache_data(max_entries=128)
+def calculate_sn_from_aashto(W18, ZR, So, delta_psi, MR):
+    """
+    คำนวณ Structural Number (SN) จากสมการ AASHTO 1993
+    ใช้ Newton-Raphson method
+    """
+    return _solve_sn(float(W18), float(ZR), float(So), float(delta_psi), float(MR))
+
+
 def calculate_layer_thickness(SN_required, a1, a2, a3, m2=1.0, m3=1.0):
     """คำนวณความหนาของแต่ละชั้น"""
     D1_min = 3.0
@@ -99,14 +93,56 @@ def calculate_layer_thickness(SN_required, a1, a2, a3, m2=1.0, m3=1.0):
     return D1_min, D2_min, D3
 
 
+# ตาราง Reliability (%) -> ZR (standard normal deviate)
+_RELIABILITY_TABLE = MappingProxyType({
+    50: 0.000, 60: -0.253, 70: -0.524, 75: -0.674,
+    80: -0.841, 85: -1.037, 90: -1.282, 95: -1.645,
+    99: -2.327, 99.9: -3.090
+})
+_RELIABILITY_LEVELS = tuple(_RELIABILITY_TABLE)
+
+
 def get_reliability_z(reliability_percent):
     """แปลง Reliability เป็น ZR"""
-    reliability_table = {
-        50: 0.000, 60: -0.253, 70: -0.524, 75: -0.674,
-        80: -0.841, 85: -1.037, 90: -1.282, 95: -1.645,
-        99: -2.327, 99.9: -3.090
-    }
-    return reliability_table.get(reliability_percent, -1.645)
+    return _RELIABILITY_TABLE.get(reliability_percent, -1.645)
+
+
+# Template รายงาน (สร้างครั้งเดียวตอน import)
+_REPORT_TEMPLATE = Template("""
+AASHTO 1993 PAVEMENT DESIGN REPORT
+==================================================
+
+INPUT PARAMETERS:
+- W18: ${W18}
+- Reliability: ${reliability}% (ZR = ${ZR})
+- Standard Error: ${So}
+- ΔPSI: ${delta_psi}
+- MR: ${MR} psi
+
+LAYER COEFFICIENTS:
+- a1 (Asphalt): ${a1}
+- a2 (Base): ${a2}
+- a3 (Subbase): ${a3}
+
+DRAINAGE COEFFICIENTS:
+- m2: ${m2}
+- m3: ${m3}
+
+RESULTS:
+- Required SN: ${SN_required}
+
+LAYER THICKNESSES:
+- Asphalt: ${D1} in (${D1_cm} cm)
+- Base: ${D2} in (${D2_cm} cm)
+- Subbase: ${D3} in (${D3_cm} cm)
+
+STRUCTURAL NUMBERS:
+- SN1: ${SN1}
+- SN2: ${SN2}
+- SN3: ${SN3}
+- Total: ${SN_total}
+==================================================
+""")
 
 
 # ================================
@@ -142,7 +178,7 @@ def main():
         st.subheader("2. Reliability")
         reliability = st.selectbox(
             "Reliability (%)",
-            options=[50, 60, 70, 75, 80, 85, 90, 95, 99, 99.9],
+            options=_RELIABILITY_LEVELS,
             index=6,
             help="ระดับความเชื่อมั่น"
         )
@@ -184,6 +220,7 @@ def main():
     with col1:
         st.header("📈 Calculation Results")
         
+        SN_required = None
         try:
             SN_required = calculate_sn_from_aashto(W18, ZR, So, delta_psi, MR)
             st.success(f"### Required Structural Number (SN) = {SN_required:.2f}")
@@ -229,6 +266,8 @@ def main():
     with col2:
         st.header("ℹ️ Design Summary")
         
+        SN_display = f"{SN_required:.2f}" if SN_required is not None else "N/A"
+        
         st.markdown(f"""
         | Parameter | Value |
         |-----------|-------|
@@ -238,7 +277,7 @@ def main():
         | So | {So:.2f} |
         | ΔPSI | {delta_psi:.1f} |
         | MR (psi) | {MR:,.0f} |
-        | **Required SN** | **{SN_required:.2f}** |
+        | **Required SN** | **{SN_display}** |
         """)
         
         st.markdown("---")
@@ -260,42 +299,31 @@ def main():
         st.markdown("---")
         st.subheader("💾 Export Results")
         
-        if st.button("📄 Generate Report"):
-            report = f"""
-AASHTO 1993 PAVEMENT DESIGN REPORT
-{'='*50}
-
-INPUT PARAMETERS:
-- W18: {W18:,.0f}
-- Reliability: {reliability}% (ZR = {ZR:.3f})
-- Standard Error: {So:.2f}
-- ΔPSI: {delta_psi:.1f}
-- MR: {MR:,.0f} psi
-
-LAYER COEFFICIENTS:
-- a1 (Asphalt): {a1:.2f}
-- a2 (Base): {a2:.2f}
-- a3 (Subbase): {a3:.2f}
-
-DRAINAGE COEFFICIENTS:
-- m2: {m2:.2f}
-- m3: {m3:.2f}
-
-RESULTS:
-- Required SN: {SN_required:.2f}
-
-LAYER THICKNESSES:
-- Asphalt: {D1:.1f} in ({D1*2.54:.1f} cm)
-- Base: {D2:.1f} in ({D2*2.54:.1f} cm)
-- Subbase: {D3:.1f} in ({D3*2.54:.1f} cm)
-
-STRUCTURAL NUMBERS:
-- SN1: {SN1:.2f}
-- SN2: {SN2:.2f}
-- SN3: {SN3:.2f}
-- Total: {SN_total:.2f}
-{'='*50}
-            """
+        if st.button("📄 Generate Report", disabled=SN_required is None):
+            report = _REPORT_TEMPLATE.substitute(
+                W18=f"{W18:,.0f}",
+                reliability=reliability,
+                ZR=f"{ZR:.3f}",
+                So=f"{So:.2f}",
+                delta_psi=f"{delta_psi:.1f}",
+                MR=f"{MR:,.0f}",
+                a1=f"{a1:.2f}",
+                a2=f"{a2:.2f}",
+                a3=f"{a3:.2f}",
+                m2=f"{m2:.2f}",
+                m3=f"{m3:.2f}",
+                SN_required=f"{SN_required:.2f}",
+                D1=f"{D1:.1f}",
+                D1_cm=f"{D1*2.54:.1f}",
+                D2=f"{D2:.1f}",
+                D2_cm=f"{D2*2.54:.1f}",
+                D3=f"{D3:.1f}",
+                D3_cm=f"{D3*2.54:.1f}",
+                SN1=f"{SN1:.2f}",
+                SN2=f"{SN2:.2f}",
+                SN3=f"{SN3:.2f}",
+                SN_total=f"{SN_total:.2f}",
+            )
             st.download_button(
                 "💾 Download Report",
                 report,